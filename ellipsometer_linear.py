@@ -10,6 +10,7 @@ import cv2
 import numpy as np
 from math import radians, degrees
 import os
+import time
 # 自作ソフトウェア関連
 import polanalyser as pa
 # 自作ハードウェア関連
@@ -17,6 +18,7 @@ import PySpin
 import EasyPySpin
 from fullscreen import FullScreen
 from autopolarizer import AutoPolarizer
+from utils.checkpoint import Checkpoint
 
 def main():
     # 出力するフォルダ名
@@ -52,12 +54,30 @@ def main():
     # カメラ側は偏光カメラなので固定
     light_angles_sequence  = [0, np.pi/4, np.pi/2, np.pi*3/4]
     camera_angles_sequence = [0, np.pi*3/4, np.pi/2, np.pi/4]
+
+    # 撮影済みのステップは再実行時に読み込む
+    # 撮影条件が異なるチェックポイントからは再開しない
+    signature = {"light_angles": [float(a) for a in light_angles_sequence],
+                 "camera_angles": [float(a) for a in camera_angles_sequence],
+                 "t_min": t_min, "t_max": t_max, "t_ref": t_ref, "num": num,
+                 "average_num": cap.average_num}
+    checkpoint = Checkpoint(f"{dir_name}/checkpoint", signature=signature)
     
     print("Capture start")
     imlist = []
     anglist_light  = []
     anglist_camera = []
     for i, radians_light in enumerate(light_angles_sequence):
+        data = checkpoint.load(i, angle=radians_light)
+        if data is not None:
+            # 撮影済みの画像を読み込む
+            print(f"  {i+1}/{len(light_angles_sequence)}: skip (checkpoint)")
+            img_demosaiced = data["frame"]
+            imlist += cv2.split(img_demosaiced)
+            anglist_light  += [radians_light]*4
+            anglist_camera += camera_angles_sequence
+            continue
+
         # 偏光板を回転
         polarizer.degree = degrees(radians_light)
 
@@ -65,7 +85,9 @@ def main():
 
         # 少し待ってから撮影
         cv2.waitKey(500)
+        t_start = time.perf_counter()
         ret, frame = cap.readHDR(t_min, t_max, num=num, t_ref=t_ref)
+        t_capture = time.perf_counter() - t_start
         
         # 偏光画像のデモザイキング
         img_demosaiced = pa.demosaicing(frame)
@@ -78,6 +100,10 @@ def main():
             os.makedirs(f"{dir_name}/JPG", exist_ok=True)
             name = f"{dir_name}/JPG/{dir_name}_l{int(degrees(radians_light))}_c{int(degrees(radians_camera))}.jpg"
             cv2.imwrite(name, (img*255).astype(np.uint8))
+
+        # 画像の書き出し後にチェックポイントを保存
+        t_save = checkpoint.save(i, frame=img_demosaiced, angle=radians_light)
+        print(f"    checkpoint: {t_save*1000:.1f} ms ({100*t_save/t_capture:.1f}% of capture)")
         
         # 撮影したの画像と角度情報をリストに追加
         imlist += cv2.split(img_demosaiced)
@@ -99,6 +125,7 @@ def main():
     img_m31, img_m32, img_m33  = cv2.split(img_mueller)
 
     np.save(f"{dir_name}/{dir_name}_img_mueller.npy", img_mueller)
+    checkpoint.clear()
     
     # 求めたミュラー行列をプロットして保存
     print("Plot the Mueller matrix")
@@ -5,11 +5,14 @@
 import cv2
 import numpy as np
 import os
+import time
 import structuredlight as sl
 import polanalyser as pa
 import PySpin
 import EasyPySpin
 from fullscreen import FullScreen
+from utils.projector import load_patterns, pattern_key, DoubleBufferedDisplay
+from utils.checkpoint import Checkpoint
 
 def main():
     dir_name = "mac_hf5x5"
@@ -35,23 +38,47 @@ def main():
 
     # 構造化光の設定
     stlight = sl.Checker(sqsize=5, step=1)
-    imlist_pattern = stlight.generate((width_prj, height_prj))
+    imlist_pattern = load_patterns(stlight, (width_prj, height_prj))
     num = len(imlist_pattern)
+
+    # 撮影済みのステップは再実行時に読み込む
+    # 撮影条件が異なるチェックポイントからは再開しない
+    signature = {"pattern": pattern_key(stlight, (width_prj, height_prj)),
+                 "projector_size": [width_prj, height_prj],
+                 "t_min": t_min, "t_max": t_max, "t_ref": t_ref, "num": num,
+                 "average_num": cap.average_num}
+    checkpoint = Checkpoint(f"{dir_name}/checkpoint", signature=signature)
     
     # 漏れ光を除去用の画像を撮影する
-    cv2.waitKey(300)
-    #ret, frame_black = cap.read()
-    ret, frame_black = cap.readHDR(t_min, t_max, num, t_ref)
-    frame_black = pa.cvtStokesToIntensity(pa.demosaicing(frame_black))
-
-    imlist_captured = []
-    for i, pattern in enumerate(imlist_pattern):
-        print("{}/{}".format(i+1, num))
-        projector.imshow(pattern)
+    data = checkpoint.load("black")
+    if data is not None:
+        frame_black = data["frame"]
+    else:
         cv2.waitKey(300)
+        #ret, frame_black = cap.read()
+        ret, frame_black = cap.readHDR(t_min, t_max, num, t_ref)
+        frame_black = pa.cvtStokesToIntensity(pa.demosaicing(frame_black))
+        checkpoint.save("black", frame=frame_black)
+
+    # 撮影済みのパターンを読み込む
+    imlist_captured = [None] * num
+    for i in range(num):
+        data = checkpoint.load(i, pattern_index=i)
+        if data is not None:
+            imlist_captured[i] = data["frame"]
+    indices = [i for i in range(num) if imlist_captured[i] is None]
+    if len(indices) < num:
+        print("Resume: {}/{} patterns captured".format(num-len(indices), num))
+
+    # 次のパターンを準備しながら投影する
+    display = DoubleBufferedDisplay(projector, imlist_pattern, wait=300, indices=indices)
+    for i in display:
+        print("{}/{}: display {:.1f} ms".format(i+1, num, display.latencies[-1]*1000))
 
         #ret, frame = cap.read()
+        t_start = time.perf_counter()
         ret, frame = cap.readHDR(t_min, t_max, num, t_ref)
+        t_capture = time.perf_counter() - t_start
         frame = pa.cvtStokesToIntensity(pa.demosaicing(frame))
         # 漏れ光を除去
         dtype = frame.dtype
@@ -60,13 +87,18 @@ def main():
         name = f"{dir_name}/{dir_name}_{i+1}.exr"
         cv2.imwrite(name, frame.astype(np.float32))
 
-        imlist_captured.append(frame)
+        # チェックポイントを保存
+        t_save = checkpoint.save(i, frame=frame, pattern_index=i)
+        print("  checkpoint: {:.1f} ms ({:.1f}% of capture)".format(t_save*1000, 100*t_save/t_capture))
+
+        imlist_captured[i] = frame
 
     img_direct, img_global = stlight.decode(imlist_captured)
     #cv2.imwrite(f"{dir_name}/{dir_name}_direct.png", img_direct.astype(np.uint8))
     #cv2.imwrite(f"{dir_name}/{dir_name}_global.png", img_global.astype(np.uint8))
     cv2.imwrite(f"{dir_name}/{dir_name}_direct.exr", img_direct.astype(np.float32))
     cv2.imwrite(f"{dir_name}/{dir_name}_global.exr", img_global.astype(np.float32))
+    checkpoint.clear()
 
     cap.release()
     projector.destroyWindow()
@@ -0,0 +1,162 @@
+"""
+Checkpoint each step of the acquisition and resume after a crash
+"""
+import numpy as np
+import os
+import time
+import json
+
+def _fsync_dir(dir_name: str) -> None:
+    """
+    Flush the directory entries (e.g. after rename) to disk
+    """
+    fd = os.open(dir_name, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class Checkpoint:
+    """
+    Store the captured data of each step durably, to skip the steps already captured on restart
+
+    The checkpoints are bound to the session signature (e.g. angle sequence and exposure).
+    Resuming captured steps with a different signature is refused, not to mix frames of different sessions.
+
+    Examples
+    --------
+    >>> checkpoint = Checkpoint("alumi/checkpoint", signature={"angles": angles, "t_ref": t_ref})
+    >>> for i, angle in enumerate(angles):
+    ...     data = checkpoint.load(i, angle=angle)
+    ...     if data is not None:
+    ...         frame = data["frame"]
+    ...     else:
+    ...         ret, frame = cap.read()
+    ...         checkpoint.save(i, frame=frame, angle=angle)
+    """
+    def __init__(self, dir_name: str, signature: dict = None):
+        """
+        Parameters
+        ----------
+        dir_name : str
+            directory to store the checkpoints
+        signature : dict, optional
+            JSON-serializable parameters of the session
+        """
+        self.dir_name = dir_name
+        os.makedirs(dir_name, exist_ok=True)
+        self.save_times = [] # time to save each step [s]
+
+        # Check the session signature only if any step is captured
+        signature = json.loads(json.dumps(signature, sort_keys=True)) # normalize (e.g. tuple -> list)
+        filename_session = os.path.join(dir_name, "session.json")
+        has_steps = any(self._is_step_file(name) for name in os.listdir(dir_name))
+        if has_steps and os.path.exists(filename_session):
+            with open(filename_session) as f:
+                signature_saved = json.load(f)
+            if signature_saved != signature:
+                raise ValueError(f"Checkpoints in '{dir_name}' are from a different session, "
+                                 f"remove the directory to start over: {signature_saved}!={signature}")
+        else:
+            self._write_durable(filename_session, lambda f: f.write(json.dumps(signature, sort_keys=True).encode()))
+
+    @staticmethod
+    def _is_step_file(name: str) -> bool:
+        return name.startswith("step_") and name.endswith(".npz")
+
+    def _filename(self, step) -> str:
+        return os.path.join(self.dir_name, f"step_{step}.npz")
+
+    def _write_durable(self, filename: str, write) -> None:
+        # Write to the temporary file, flush it and rename, then flush the rename
+        filename_tmp = filename + ".tmp"
+        with open(filename_tmp, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(filename_tmp, filename)
+        _fsync_dir(self.dir_name)
+
+    def has(self, step) -> bool:
+        """
+        Return True if the step is already captured
+        """
+        return os.path.exists(self._filename(step))
+
+    def save(self, step, **arrays) -> float:
+        """
+        Save the arrays of the step
+        The file is written to the temporary file, flushed to disk and renamed,
+        so that a crash never leaves a broken checkpoint.
+
+        Parameters
+        ----------
+        step : int or str
+            step index (e.g. angle or pattern index)
+        **arrays : np.ndarray
+            arrays to save (e.g. frame=frame, angle=angle)
+        Returns
+        -------
+        elapsed : float
+            time to save [s]
+        """
+        t_start = time.perf_counter()
+        # No compression, to keep the overhead small
+        self._write_durable(self._filename(step), lambda f: np.savez(f, **arrays))
+        elapsed = time.perf_counter() - t_start
+        self.save_times.append(elapsed)
+        return elapsed
+
+    def load(self, step, **expected):
+        """
+        Load the arrays of the step
+
+        Parameters
+        ----------
+        step : int or str
+            step index
+        **expected : np.ndarray
+            values which the saved arrays must match (e.g. angle=angle)
+        Returns
+        -------
+        arrays : dict or None
+            saved arrays, or None if the step is not captured or does not match 'expected'
+        """
+        if not self.has(step):
+            return None
+
+        with np.load(self._filename(step)) as data:
+            arrays = {key: data[key] for key in data.files}
+
+        for key, value in expected.items():
+            if key not in arrays or not np.allclose(arrays[key], value):
+                print(f"Checkpoint of step {step} does not match '{key}', recapture it")
+                return None
+
+        return arrays
+
+    def clear(self) -> None:
+        """
+        Remove all checkpoints (e.g. after the session is completed)
+        """
+        for name in os.listdir(self.dir_name):
+            if name.startswith("step_") or name.startswith("session.json"):
+                os.remove(os.path.join(self.dir_name, name))
+
+def main():
+    # チェックポイントの保存時間を測る
+    import tempfile
+    frame = np.random.rand(2048, 2448).astype(np.float32)
+    angles = [np.pi/4*i for i in range(8)]
+    with tempfile.TemporaryDirectory() as dir_name:
+        checkpoint = Checkpoint(dir_name, signature={"angles": angles})
+        for i, angle in enumerate(angles):
+            if checkpoint.load(i, angle=angle) is None:
+                checkpoint.save(i, frame=frame, angle=angle)
+        print(f"Save time: {np.mean(checkpoint.save_times)*1000:.1f} ms/step")
+
+        checkpoint = Checkpoint(dir_name, signature={"angles": angles})
+        print(f"Resume: {sum(checkpoint.load(i, angle=angle) is not None for i, angle in enumerate(angles))}/8 steps captured")
+
+if __name__=="__main__":
+    main()
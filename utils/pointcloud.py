@@ -0,0 +1,204 @@
+"""
+Point cloud downsampling, outlier removal and nearest-neighbor search
+"""
+import numpy as np
+
+def voxel_downsample(points_3D: np.ndarray, voxel_size: float) -> np.ndarray:
+    """
+    Downsample 3D points with the voxel grid
+    Points in the same voxel are replaced by their centroid.
+    Points with non-finite (NaN or inf) coordinates are dropped.
+
+    Parameters
+    ----------
+    points_3D : np.ndarray, (N, 3)
+        3D points
+    voxel_size : float
+        edge length of the voxel
+    Returns
+    -------
+    points_down : np.ndarray, (M, 3)
+        downsampled 3D points (M <= N), same dtype as 'points_3D' if it is floating
+    """
+    N, dim = points_3D.shape
+    assert dim==3, f"'points_3D' dimention must be 3: {dim}"
+    assert voxel_size > 0, f"'voxel_size' must be positive: {voxel_size}"
+    dtype = points_3D.dtype if np.issubdtype(points_3D.dtype, np.floating) else np.float64
+
+    # Drop invalid points (e.g. invalid pixels of the decoded correspondences)
+    points_3D = points_3D[np.isfinite(points_3D).all(axis=1)]
+    if len(points_3D) == 0:
+        return np.empty((0, 3), dtype=dtype)
+
+    # Integer voxel coordinates
+    coords = np.floor(points_3D / voxel_size).astype(np.int64) # (N, 3)
+
+    # Group the same voxel coordinates by sorting them (no limit on the extent of the points)
+    order = np.lexsort(coords.T)
+    coords_sorted = coords[order]
+    is_new = np.empty(len(order), dtype=bool)
+    is_new[0] = True
+    np.any(coords_sorted[1:] != coords_sorted[:-1], axis=1, out=is_new[1:])
+    del coords, coords_sorted
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(is_new) - 1 # voxel index of each point
+
+    # Average the points per voxel
+    M = int(np.count_nonzero(is_new))
+    counts = np.bincount(inverse, minlength=M)
+    points_down = np.empty((M, 3), dtype=dtype)
+    for i in range(3):
+        points_down[:,i] = np.bincount(inverse, weights=points_3D[:,i], minlength=M) / counts
+
+    return points_down
+
+def query_nearest(points_3D: np.ndarray,
+                  query_points: np.ndarray,
+                  k: int = 1,
+                  chunk_size: int = 1000000,
+                  tree=None,
+                  out_distances: np.ndarray = None,
+                  out_indices: np.ndarray = None):
+    """
+    k-nearest neighbor query with the KD-tree, in chunks of query points
+
+    The queries are processed 'chunk_size' points at a time, so the query points
+    and the outputs can be memory-mapped arrays (np.memmap) larger than memory.
+
+    Parameters
+    ----------
+    points_3D : np.ndarray, (N, 3)
+        3D points to search (ignored if 'tree' is given)
+    query_points : np.ndarray, (Q, 3)
+        query points
+    k : int
+        number of neighbors
+    chunk_size : int
+        number of query points per chunk
+    tree : scipy.spatial.cKDTree, optional
+        prebuilt KD-tree of 'points_3D'
+    out_distances : np.ndarray, (Q, k), optional
+        output array of the distances
+    out_indices : np.ndarray, (Q, k), optional
+        output array of the indices
+    Returns
+    -------
+    distances : np.ndarray, (Q, k)
+        distances to the neighbors
+    indices : np.ndarray, (Q, k)
+        indices of the neighbors in 'points_3D'
+    """
+    from scipy.spatial import cKDTree
+    if tree is None:
+        tree = cKDTree(points_3D)
+
+    Q = len(query_points)
+    distances = np.empty((Q, k)) if out_distances is None else out_distances
+    indices = np.empty((Q, k), dtype=np.int64) if out_indices is None else out_indices
+    for start in range(0, Q, chunk_size):
+        end = min(start + chunk_size, Q)
+        d, idx = tree.query(np.asarray(query_points[start:end]), k=k, workers=-1)
+        distances[start:end] = d.reshape(-1, k)
+        indices[start:end] = idx.reshape(-1, k)
+
+    return distances, indices
+
+def statistical_outlier_mask(points_3D: np.ndarray,
+                             nb_neighbors: int = 20,
+                             std_ratio: float = 2.0,
+                             chunk_size: int = 1000000) -> np.ndarray:
+    """
+    Detect outliers whose mean distance to the neighbors is far from the average
+
+    Parameters
+    ----------
+    points_3D : np.ndarray, (N, 3)
+        3D points
+    nb_neighbors : int
+        number of neighbors to calculate the mean distance
+    std_ratio : float
+        threshold in the standard deviation of the mean distances
+    chunk_size : int
+        number of query points per chunk
+    Returns
+    -------
+    mask : np.ndarray, (N,)
+        True for inliers
+    """
+    N = len(points_3D)
+    assert nb_neighbors >= 1, f"'nb_neighbors' must be positive: {nb_neighbors}"
+    assert N > nb_neighbors, f"Number of points must be larger than 'nb_neighbors': {N}<={nb_neighbors}"
+
+    from scipy.spatial import cKDTree
+    tree = cKDTree(points_3D)
+
+    # The nearest neighbor is the point itself
+    mean_distances = np.empty(N)
+    for start in range(0, N, chunk_size):
+        end = min(start + chunk_size, N)
+        d, _ = tree.query(np.asarray(points_3D[start:end]), k=nb_neighbors+1, workers=-1)
+        mean_distances[start:end] = np.mean(d[:,1:], axis=1)
+
+    threshold = np.mean(mean_distances) + std_ratio * np.std(mean_distances)
+    return mean_distances <= threshold
+
+def radius_outlier_mask(points_3D: np.ndarray,
+                        radius: float,
+                        min_neighbors: int = 5,
+                        chunk_size: int = 1000000) -> np.ndarray:
+    """
+    Detect outliers which have few neighbors within the radius
+
+    Parameters
+    ----------
+    points_3D : np.ndarray, (N, 3)
+        3D points
+    radius : float
+        search radius
+    min_neighbors : int
+        minimum number of neighbors (except the point itself)
+    chunk_size : int
+        number of query points per chunk
+    Returns
+    -------
+    mask : np.ndarray, (N,)
+        True for inliers
+    """
+    from scipy.spatial import cKDTree
+    tree = cKDTree(points_3D)
+
+    N = len(points_3D)
+    mask = np.empty(N, dtype=bool)
+    for start in range(0, N, chunk_size):
+        end = min(start + chunk_size, N)
+        counts = tree.query_ball_point(np.asarray(points_3D[start:end]), r=radius, return_length=True, workers=-1)
+        mask[start:end] = (counts - 1) >= min_neighbors
+
+    return mask
+
+def main():
+    import time
+    from reconstruction3D import write_ply
+
+    # 球の点群に外れ値を加える
+    N = 10000000
+    theta = np.random.rand(N) * np.pi
+    phi = np.random.rand(N) * np.pi*2
+    points_3D = np.array([np.sin(theta)*np.cos(phi), np.sin(theta)*np.sin(phi), np.cos(theta)]).T
+    points_3D[:N//100] *= np.random.uniform(1.1, 2.0, (N//100, 1))
+    points_3D[N//100] = 1e9 # 遠く離れた外れ値
+    points_3D[N//100+1] = np.nan # 無効な点
+
+    t_start = time.perf_counter()
+    points_down = voxel_downsample(points_3D, voxel_size=0.01)
+    print(f"Voxel downsample: {N} -> {len(points_down)} points, {time.perf_counter()-t_start:.2f} s")
+    assert np.isfinite(points_down).all() and len(points_down) > 1
+
+    t_start = time.perf_counter()
+    mask = statistical_outlier_mask(points_down, nb_neighbors=20, std_ratio=2.0)
+    print(f"Statistical outlier: {np.count_nonzero(~mask)} points removed, {time.perf_counter()-t_start:.2f} s")
+
+    write_ply("sphere_filtered.ply", points_down, mask=mask)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Projector pattern cache and double-buffered display
+"""
+import numpy as np
+import os
+import sys
+import time
+import json
+import hashlib
+import threading
+
+def pattern_key(stlight, size: tuple) -> str:
+    """
+    Make the cache key from the pattern type, its parameters, the library version and the projector resolution
+    Only JSON-serializable parameters are allowed, so that the key is the same over runs.
+
+    Parameters
+    ----------
+    stlight : object
+        structured light instance (e.g. structuredlight.Checker)
+    size : tuple
+        projector resolution (width, height)
+    Returns
+    -------
+    key : str
+        cache key
+    """
+    params = {k: v for k, v in vars(stlight).items() if not k.startswith("_")}
+    # Patterns may change with the library version (e.g. structuredlight)
+    module = sys.modules.get(type(stlight).__module__.split(".")[0])
+    version = getattr(module, "__version__", None)
+    try:
+        desc = json.dumps({"type": type(stlight).__name__,
+                           "version": version,
+                           "params": params,
+                           "size": [int(size[0]), int(size[1])]}, sort_keys=True)
+    except TypeError as e:
+        raise TypeError(f"Parameters of '{type(stlight).__name__}' must be JSON-serializable to be cached: {params}") from e
+    digest = hashlib.sha1(desc.encode()).hexdigest()[:16]
+    return f"{type(stlight).__name__}_{size[0]}x{size[1]}_{digest}"
+
+def load_patterns(stlight, size: tuple, cache_dir: str = ".pattern_cache") -> np.ndarray:
+    """
+    Load the projection patterns from the cache, or generate and cache them
+
+    The patterns are stored as a single stack (.npy) and opened as a memory-mapped array,
+    so each pattern is read from disk only when it is accessed.
+
+    Parameters
+    ----------
+    stlight : object
+        structured light instance which has 'generate(size)'
+    size : tuple
+        projector resolution (width, height)
+    cache_dir : str
+        cache directory name
+    Returns
+    -------
+    patterns : np.ndarray, (num, height, width) or (num, height, width, channel)
+        memory-mapped pattern stack
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    filename = os.path.join(cache_dir, pattern_key(stlight, size) + ".npy")
+
+    if not os.path.exists(filename):
+        imlist_pattern = stlight.generate(size)
+        # Write to the temporary file and rename, not to leave a broken cache
+        filename_tmp = filename + ".tmp.npy"
+        np.save(filename_tmp, np.stack(imlist_pattern))
+        os.replace(filename_tmp, filename)
+
+    return np.load(filename, mmap_mode="r")
+
+class FakeFullScreen:
+    """
+    Headless stand-in of 'fullscreen.FullScreen'
+    Keeps the displayed images instead of showing them.
+    """
+    def __init__(self, screen_id: int = 0, width: int = 1920, height: int = 1080, delay: float = 0.0):
+        self.screen_id = screen_id
+        self.width  = width
+        self.height = height
+        self.delay = delay # emulated display latency [s]
+        self.imlist_shown = []
+
+    def imshow(self, img) -> None:
+        if np.isscalar(img):
+            img = np.full((self.height, self.width), img, dtype=np.uint8)
+        time.sleep(self.delay)
+        self.imlist_shown.append(img)
+
+    def destroyWindow(self) -> None:
+        pass
+
+class DoubleBufferedDisplay:
+    """
+    Display the patterns in order while preparing the next one in the background
+
+    While the current pattern is being exposed, the next pattern is read from the
+    memory-mapped stack into memory in a worker thread, so that only the display
+    itself is left on the critical path. The display stays in the caller's thread
+    because of the GUI backend.
+
+    Examples
+    --------
+    >>> display = DoubleBufferedDisplay(projector, patterns)
+    >>> for i in display:
+    ...     ret, frame = cap.read() # pattern i is on the screen
+    >>> display.latencies # per-pattern display latency (imshow and its drawing) [s]
+    >>> display.waits # per-pattern settle wait [s]
+    """
+    def __init__(self, projector, patterns, wait: int = 300, waitKey=None, indices=None):
+        """
+        Parameters
+        ----------
+        projector : FullScreen or FakeFullScreen
+            projector window
+        patterns : sequence of np.ndarray
+            projection patterns
+        wait : int
+            waiting time after the display [ms]
+        waitKey : callable, optional
+            function to wait for the display (default: cv2.waitKey)
+        indices : sequence of int, optional
+            indices of the patterns to display (default: all)
+        """
+        if waitKey is None:
+            import cv2
+            waitKey = cv2.waitKey
+        self.projector = projector
+        self.patterns = patterns
+        self.wait = wait
+        self.waitKey = waitKey
+        self.indices = list(range(len(patterns))) if indices is None else list(indices)
+        self.latencies = []
+        self.waits = []
+        self._next = None
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def _prepare(self, i: int) -> None:
+        # Copy to force the read from the disk, not to keep a view of the memmap
+        self._next = np.array(self.patterns[i], copy=True)
+
+    def _start_prepare(self, i: int) -> None:
+        self._thread = threading.Thread(target=self._prepare, args=(i,), daemon=True)
+        self._thread.start()
+
+    def _take_prepared(self) -> np.ndarray:
+        self._thread.join()
+        pattern, self._next = self._next, None
+        return pattern
+
+    def show(self, pattern) -> float:
+        """
+        Display the pattern and wait for it
+        With OpenCV HighGUI, imshow only queues the image and the drawing happens in waitKey,
+        so the display latency is measured until a waitKey(1) that flushes the drawing.
+
+        Returns
+        -------
+        latency : float
+            display latency (imshow and its drawing) without the settle wait [s]
+        """
+        t_start = time.perf_counter()
+        self.projector.imshow(pattern)
+        self.waitKey(1)
+        latency = time.perf_counter() - t_start
+        self.latencies.append(latency)
+
+        t_start = time.perf_counter()
+        self.waitKey(max(self.wait - 1, 1))
+        self.waits.append(time.perf_counter() - t_start)
+        return latency
+
+    def __iter__(self):
+        indices = self.indices
+        if len(indices) == 0:
+            return
+        self._start_prepare(indices[0])
+        for j, i in enumerate(indices):
+            pattern = self._take_prepared()
+            self.show(pattern)
+            if j+1 < len(indices):
+                self._start_prepare(indices[j+1])
+            yield i
+
+def main():
+    # ダミーのプロジェクタでパターン投影の例
+    class Stripe:
+        def __init__(self, period):
+            self.period = period
+        def generate(self, size):
+            width, height = size
+            x = np.arange(width)
+            return [np.tile(((x+shift)%self.period < self.period//2).astype(np.uint8)*255, (height, 1))
+                    for shift in range(self.period)]
+
+    projector = FakeFullScreen(width=1920, height=1080, delay=0.005)
+    patterns = load_patterns(Stripe(8), (projector.width, projector.height))
+
+    display = DoubleBufferedDisplay(projector, patterns, wait=10, waitKey=lambda ms: time.sleep(ms/1000))
+    for i in display:
+        print(f"{i+1}/{len(display)}: {display.latencies[-1]*1000:.2f} ms")
+
+if __name__=="__main__":
+    main()
@@ -4,7 +4,7 @@
 import numpy as np
 import os
 
-def write_ply(filename: str, points_3D: np.ndarray) -> None:
+def write_ply(filename: str, points_3D: np.ndarray, mask: np.ndarray = None, chunk_size: int = 100000) -> None:
     """
     Export 3D points to ply file
 
@@ -14,11 +14,20 @@ def write_ply(filename: str, points_3D: np.ndarray) -> None:
         ply file name
     points_3D : np.ndarray, (N, 3)
         3D points
+    mask : np.ndarray, (N,), optional
+        points to export (e.g. inliers of 'pointcloud.statistical_outlier_mask')
+    chunk_size : int
+        number of points written at a time
     """
     name, ext = os.path.splitext(filename)
     assert ext==".ply", f"'filename' extension must be '.ply': '{filename}'"
 
-    N = len(points_3D)
+    if mask is not None:
+        mask = np.asarray(mask)
+        assert mask.dtype==bool, f"'mask' must be a boolean array: {mask.dtype}"
+        assert len(mask)==len(points_3D), f"'mask' and 'points_3D' length must be same size: {len(mask)}!={len(points_3D)}"
+
+    N = len(points_3D) if mask is None else int(np.count_nonzero(mask))
     header  = 'ply\n'
     header += 'format ascii 1.0\n'
     header += f'element vertex {N}\n'
@@ -31,8 +40,12 @@ def write_ply(filename: str, points_3D: np.ndarray) -> None:
     header += 'end_header\n'
     with open(filename, 'w') as f:
         f.write(header)
-        for x, y, z in points_3D:
-            f.write(f'{x} {y} {z}\n')
+        # Write in chunks not to copy the whole (filtered) points
+        for start in range(0, len(points_3D), chunk_size):
+            points_chunk = points_3D[start:start+chunk_size]
+            if mask is not None:
+                points_chunk = points_chunk[mask[start:start+chunk_size]]
+            f.writelines(f'{x} {y} {z}\n' for x, y, z in points_chunk.tolist())
             #b, g, r = (0, 0, 0)
             #f.write('{} {} {} {} {} {}\n'.format(x, y, z, r, g, b))
 